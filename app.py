@@ -1,25 +1,89 @@
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, session
+from flask import Flask, Blueprint, render_template, request, jsonify, flash, redirect, url_for, session
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
+from flask_caching import Cache
+from flask_session import Session
+from cachetools import TTLCache
+from sqlalchemy import insert, select, text, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import raiseload
+import ast
+import atexit
 import datetime
+import json
+import math
+import orjson
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from types import MappingProxyType
 
-app = Flask(__name__)
+app = Flask(__name__, template_folder='template')
+# Keep every compiled template in memory
+app.jinja_options = {**app.jinja_options, 'cache_size': -1}
+
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes and decodes with orjson."""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        # The session serializer passes object_hook to untag tuples, flashes, etc.,
+        # which orjson doesn't support
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+app.json = ORJSONProvider(app)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-2024')
 
 # Database configuration for Render
 if 'DATABASE_URL' in os.environ:
     # Render PostgreSQL
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ['DATABASE_URL'].replace("postgres://", "postgresql://", 1)
+    # Keep warm connections across requests. Each gunicorn worker has its own pool,
+    # so workers * (DB_POOL_SIZE + max_overflow) must stay under max_connections.
+    # pool_recycle stays below Render's 300 s idle timeout.
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': 5,
+        'pool_pre_ping': True,
+        'pool_recycle': 280,
+        'pool_use_lifo': True,
+    }
     print("Using Render PostgreSQL database")
 else:
     # SQLite for development
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///vending_machine.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('LOCAL_DATABASE_URL', 'sqlite:///vending_machine.db')
     print("Using local SQLite database")
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+
+# Session storage
+if 'REDIS_URL' in os.environ:
+    # Server-side sessions in Render Redis; the cookie only carries the session ID
+    import redis
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['SESSION_REDIS'] = redis.from_url(os.environ['REDIS_URL'])
+    Session(app)
+    print("Using Redis session storage")
+else:
+    # Signed cookie sessions for development
+    print("Using cookie session storage")
+
 db = SQLAlchemy(app)
 
+# In-process cache; each worker keeps its own copy, bounded by the timeout
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 30})
+
 # Database Models
+# Denomination counts are stored as JSON, using JSONB on PostgreSQL
+_JSON = db.JSON().with_variant(postgresql.JSONB(), 'postgresql')
+
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -27,133 +91,301 @@ class Product(db.Model):
     price = db.Column(db.Float, nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
 
+    __table_args__ = (db.Index('ix_product_type_id', 'type', 'id'),)
+
 class TransactionLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.String(20), nullable=False)
-    time = db.Column(db.String(20), nullable=False)
-    amount_inserted_notes = db.Column(db.Text, nullable=False)
-    amount_inserted_coins = db.Column(db.Text, nullable=False)
-    change_returned_notes = db.Column(db.Text, nullable=False)
-    change_returned_coins = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now, index=True)
+    amount_inserted_notes = db.Column(_JSON, nullable=False)
+    amount_inserted_coins = db.Column(_JSON, nullable=False)
+    change_returned_notes = db.Column(_JSON, nullable=False)
+    change_returned_coins = db.Column(_JSON, nullable=False)
     total_amount = db.Column(db.Float, nullable=False)
     change_amount = db.Column(db.Float, nullable=False)
     products_purchased = db.Column(db.Text, nullable=True)
 
 # Initialize database
-@app.before_first_request
+SAMPLE_PRODUCTS = [
+    {'id': 1, 'name': 'sando', 'type': 'cake', 'price': 15, 'quantity': 10},
+    {'id': 2, 'name': 'lays', 'type': 'cake', 'price': 20, 'quantity': 8},
+    {'id': 3, 'name': 'm&m', 'type': 'cake', 'price': 30, 'quantity': 5},
+    {'id': 4, 'name': 'Coca Cola', 'type': 'drink', 'price': 50, 'quantity': 15},
+    {'id': 5, 'name': 'Sprite', 'type': 'drink', 'price': 45, 'quantity': 12},
+    {'id': 6, 'name': 'water', 'type': 'drink', 'price': 25, 'quantity': 10}
+]
+
+def upgrade_schema():
+    """Bring tables created by older versions of the app up to date, since
+    create_all() only creates missing tables and never alters existing ones."""
+    inspector = db.inspect(db.engine)
+    log_columns = {column['name']: column['type'] for column in inspector.get_columns('transaction_log')}
+    postgres = db.engine.dialect.name == 'postgresql'
+    # Denomination counts used to be Python dict reprs in TEXT columns
+    json_type = postgresql.JSONB if postgres else db.JSON
+    text_denom_columns = [name for name in ('amount_inserted_notes', 'amount_inserted_coins',
+                                            'change_returned_notes', 'change_returned_coins')
+                          if not isinstance(log_columns[name], json_type)]
+    
+    with db.engine.begin() as conn:
+        if 'created_at' not in log_columns:
+            # The date and time text columns were merged into created_at
+            conn.execute(text("ALTER TABLE transaction_log ADD COLUMN created_at TIMESTAMP"))
+            if postgres:
+                conn.execute(text('UPDATE transaction_log SET created_at = ("date" || \' \' || "time")::timestamp'))
+                conn.execute(text("ALTER TABLE transaction_log ALTER COLUMN created_at SET NOT NULL"))
+            else:
+                conn.execute(text('UPDATE transaction_log SET created_at = "date" || \' \' || "time"'))
+            conn.execute(text('ALTER TABLE transaction_log DROP COLUMN "date"'))
+            conn.execute(text('ALTER TABLE transaction_log DROP COLUMN "time"'))
+            print("Migrated transaction_log date/time to created_at")
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_transaction_log_created_at ON transaction_log (created_at)"))
+        
+        for column in text_denom_columns:
+            # SQLite keeps these columns as TEXT after conversion, so only
+            # revisit rows that aren't JSON yet instead of parsing every row
+            query = f"SELECT id, {column} FROM transaction_log"
+            if not postgres:
+                query += f" WHERE NOT json_valid({column})"
+            updates = []
+            for row_id, value in conn.execute(text(query)):
+                converted = _dict_repr_to_json(value)
+                if converted is not None:
+                    updates.append({'id': row_id, 'value': converted})
+            if updates:
+                conn.execute(text(f"UPDATE transaction_log SET {column} = :value WHERE id = :id"), updates)
+                print(f"Converted {len(updates)} transaction_log.{column} value(s) to JSON")
+            if postgres:
+                conn.execute(text(f"ALTER TABLE transaction_log ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_product_type_id ON product (type, id)"))
+
+def _dict_repr_to_json(value):
+    """Convert a stored Python dict repr to JSON text, or return None if it's already JSON."""
+    try:
+        json.loads(value)
+        return None
+    except ValueError:
+        return json.dumps({str(denom): count for denom, count in ast.literal_eval(value).items()})
+
+# Arbitrary key for the PostgreSQL advisory lock that serializes schema setup
+_SCHEMA_LOCK_KEY = 0x76656e64
+
+@contextmanager
+def _schema_lock():
+    """Hold a PostgreSQL advisory lock so gunicorn workers starting together
+    run schema setup one at a time instead of racing on DDL."""
+    if db.engine.dialect.name != 'postgresql':
+        yield
+        return
+    with db.engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': _SCHEMA_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': _SCHEMA_LOCK_KEY})
+
 def create_tables():
-    db.create_all()
-    # Add sample products if empty
-    if Product.query.count() == 0:
-        sample_products = [
-            Product(id=1, name='sando', type='cake', price=15, quantity=10),
-            Product(id=2, name='lays', type='cake', price=20, quantity=8),
-            Product(id=3, name='m&m', type='cake', price=30, quantity=5),
-            Product(id=4, name='Coca Cola', type='drink', price=50, quantity=15),
-            Product(id=5, name='Sprite', type='drink', price=45, quantity=12),
-            Product(id=6, name='water', type='drink', price=25, quantity=10)
-        ]
-        db.session.bulk_save_objects(sample_products)
-        db.session.commit()
-        print("Sample products added to database")
+    with _schema_lock():
+        db.create_all()
+        upgrade_schema()
+        # Add sample products only if the table is empty, so deleted products stay deleted
+        if not db.session.query(Product.query.exists()).scalar():
+            db.session.execute(insert(Product.__table__), SAMPLE_PRODUCTS)
+            db.session.commit()
+            print("Sample products added to database")
+
+with app.app_context():
+    create_tables()
 
 # Denominations
 NOTES = [100, 50, 25, 20]
 COINS = [10, 5, 1, 0.50, 0.25, 0.10, 0.05]
 
+# Denominations in descending order, and their values in paise. All money
+# arithmetic is done in integer paise; rupees are only used for display.
+_DENOMS_DESC = tuple(sorted(NOTES + COINS, reverse=True))
+_DENOMS_PAISE = tuple(int(round(denom * 100)) for denom in _DENOMS_DESC)
+_DENOM_BY_PAISE = MappingProxyType(dict(zip(_DENOMS_PAISE, _DENOMS_DESC)))
+# Zeroed per-denomination counters for a fresh session, keyed by paise (as strings,
+# since session JSON keys always come back as strings)
+_EMPTY_DENOMS = MappingProxyType({str(paise): 0 for paise in _DENOMS_PAISE})
+# Every denomination is a multiple of this many paise
+_PAISE_STEP = math.gcd(*_DENOMS_PAISE)
+
+def _build_change_table():
+    """For each amount below the largest note (in _PAISE_STEP units), record the
+    index of the last denomination used in a fewest-pieces breakdown."""
+    units = [paise // _PAISE_STEP for paise in _DENOMS_PAISE]
+    pieces = [0] * units[0]
+    last = [0] * units[0]
+    for amount in range(1, units[0]):
+        best = None
+        for i, unit in enumerate(units):
+            if unit <= amount and (best is None or pieces[amount - unit] < pieces[amount - units[best]]):
+                best = i
+        pieces[amount] = pieces[amount - units[best]] + 1
+        last[amount] = best
+    return tuple(units), tuple(last)
+
+_CHANGE_UNITS, _CHANGE_LAST = _build_change_table()
+
+# Per-denomination line templates for format_change_message
+_NOTE_TEMPLATES = {denom: f"Rs {denom}: {{}} note(s)" for denom in _DENOMS_DESC if denom >= 1}
+_COIN_TEMPLATES = {denom: f"Rs {denom:.2f}: {{}} coin(s)" for denom in _DENOMS_DESC if denom < 1}
+
+@cache.memoize(timeout=30)
+def get_product_lists():
+    """Return the (cakes, drinks) shown on the index page as plain dicts."""
+    # raiseload('*') makes any accidental lazy load fail loudly instead of issuing N+1 queries
+    products = (Product.query.options(raiseload('*'))
+                .filter(Product.type.in_(('cake', 'drink')))
+                .order_by(Product.type, Product.id).all())
+    rows = [{'id': p.id, 'name': p.name, 'type': p.type, 'price': p.price, 'quantity': p.quantity}
+            for p in products]
+    cakes = [p for p in rows if p['type'] == 'cake']
+    drinks = [p for p in rows if p['type'] == 'drink']
+    return cakes, drinks
+
+# Product name and price rarely change, so each worker keeps them briefly in memory
+_product_meta_cache = TTLCache(maxsize=256, ttl=60)
+_product_meta_lock = threading.Lock()
+
+def get_product_metas(product_ids):
+    """Return {product_id: (name, price)} for those of product_ids that exist,
+    loading any that aren't cached in a single query."""
+    metas = {}
+    with _product_meta_lock:
+        for product_id in product_ids:
+            meta = _product_meta_cache.get(product_id)
+            if meta is not None:
+                metas[product_id] = meta
+    missing = set(product_ids) - metas.keys()
+    if missing:
+        rows = db.session.execute(
+            select(Product.id, Product.name, Product.price).where(Product.id.in_(missing))
+        ).all()
+        for product_id, name, price in rows:
+            metas[product_id] = remember_product_meta(product_id, name, price)
+    return metas
+
+def remember_product_meta(product_id, name, price):
+    with _product_meta_lock:
+        meta = _product_meta_cache[product_id] = (name, price)
+    return meta
+
+def forget_product_meta(product_id):
+    with _product_meta_lock:
+        _product_meta_cache.pop(product_id, None)
+
 # Routes
-@app.route('/')
+# Customer-facing routes and the admin UI live in separate blueprints
+storefront_bp = Blueprint('store', __name__)
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+@storefront_bp.route('/')
 def index():
-    cakes = Product.query.filter_by(type='cake').order_by(Product.id).all()
-    drinks = Product.query.filter_by(type='drink').order_by(Product.id).all()
+    cakes, drinks = get_product_lists()
     
     # Initialize session if not exists
-    if 'inserted_money' not in session:
-        session['inserted_money'] = 0.0
-        session['denominations_inserted'] = {str(denom): 0 for denom in NOTES + COINS}
+    if 'inserted_paise' not in session:
+        session['inserted_paise'] = 0
+        session['denominations_inserted'] = dict(_EMPTY_DENOMS)
         session['current_transaction'] = []
     
     return render_template('index.html', 
                          cakes=cakes, 
                          drinks=drinks, 
-                         inserted_money=session['inserted_money'],
+                         inserted_money=session['inserted_paise'] / 100,
                          notes=NOTES,
                          coins=COINS)
 
-@app.route('/insert_money', methods=['POST'])
+@storefront_bp.route('/insert_money', methods=['POST'])
 def insert_money():
-    amount = float(request.form['amount'])
-    session['inserted_money'] += amount
+    try:
+        amount, = _form(amount=float)
+        paise = int(round(amount * 100))
+    except (ValueError, OverflowError):
+        return jsonify({'error': 'Please enter a valid amount'}), 400
     
-    # Update denominations
-    denom_key = str(amount)
-    if denom_key in session['denominations_inserted']:
-        session['denominations_inserted'][denom_key] += 1
+    if paise not in _DENOM_BY_PAISE:
+        return jsonify({'error': f'Invalid denomination: Rs {amount:.2f}'}), 400
     
+    session['inserted_paise'] += paise
+    session['denominations_inserted'][str(paise)] += 1
     session.modified = True
     
     return jsonify({
-        'inserted_money': round(session['inserted_money'], 2),
-        'message': f'Inserted: Rs {amount:.2f}'
+        'inserted_money': session['inserted_paise'] / 100,
+        'message': _inserted_message(_DENOM_BY_PAISE[paise])
     })
 
-@app.route('/purchase', methods=['POST'])
+@storefront_bp.route('/purchase', methods=['POST'])
 def purchase():
     try:
-        product_id = int(request.form['product_id'])
-        quantity = int(request.form['quantity'])
+        product_id, quantity = _form(product_id=int, quantity=int)
     except ValueError:
         return jsonify({'error': 'Please enter valid product ID and quantity'}), 400
     
-    product = Product.query.get(product_id)
-    if not product:
-        return jsonify({'error': 'Invalid product ID'}), 400
+    if quantity < 1:
+        return jsonify({'error': 'Please enter valid product ID and quantity'}), 400
     
-    if product.quantity < quantity:
-        return jsonify({'error': f'Insufficient quantity. Only {product.quantity} available'}), 400
+    # Decrement stock in a single conditional UPDATE so concurrent purchases
+    # can't both take the last items
+    row = db.session.execute(
+        update(Product)
+        .where(Product.id == product_id,
+               Product.quantity >= quantity,
+               # i.e. round(price * quantity * 100) <= inserted_paise
+               Product.price * quantity * 100 < session['inserted_paise'] + 0.5)
+        .values(quantity=Product.quantity - quantity)
+        .returning(Product.name, Product.price, Product.quantity)
+    ).first()
     
-    total_cost = product.price * quantity
+    if row is None:
+        # Nothing was updated; look the product up only to report why
+        db.session.rollback()
+        product = db.session.get(Product, product_id)
+        if not product:
+            return jsonify({'error': 'Invalid product ID'}), 400
+        
+        if product.quantity < quantity:
+            return jsonify({'error': f'Insufficient quantity. Only {product.quantity} available'}), 400
+        
+        return jsonify({'error': f'Insufficient funds. Required: Rs {product.price * quantity:.2f}'}), 400
     
-    if session['inserted_money'] < total_cost:
-        return jsonify({'error': f'Insufficient funds. Required: Rs {total_cost:.2f}'}), 400
+    name, price, remaining_quantity = row
+    remember_product_meta(product_id, name, price)
+    total_cost = price * quantity
     
     # Process purchase
-    product.quantity -= quantity
-    session['inserted_money'] -= total_cost
+    session['inserted_paise'] -= int(round(total_cost * 100))
     
-    # Add to current transaction
-    purchase_item = {
-        'product_id': product_id,
-        'name': product.name,
-        'quantity': quantity,
-        'price': product.price,
-        'total': total_cost
-    }
-    session['current_transaction'].append(purchase_item)
+    # Add to current transaction; name and price are looked up again when it's logged
+    session['current_transaction'].append((product_id, quantity))
     
     db.session.commit()
+    cache.delete_memoized(get_product_lists)
     session.modified = True
     
     return jsonify({
-        'success': f'Purchase successful! Purchased {quantity} x {product.name}. Remaining balance: Rs {session["inserted_money"]:.2f}',
-        'inserted_money': round(session['inserted_money'], 2),
-        'remaining_quantity': product.quantity
+        'success': f'Purchase successful! Purchased {quantity} x {name}. Remaining balance: Rs {session["inserted_paise"] / 100:.2f}',
+        'inserted_money': session['inserted_paise'] / 100,
+        'remaining_quantity': remaining_quantity
     })
 
-@app.route('/return_change', methods=['POST'])
+@storefront_bp.route('/return_change', methods=['POST'])
 def return_change():
-    if session['inserted_money'] > 0:
-        change_breakdown = calculate_change(session['inserted_money'])
+    if session['inserted_paise'] > 0:
+        change_breakdown = calculate_change(session['inserted_paise'])
         change_message = format_change_message(change_breakdown)
         
         # Log transaction
         log_transaction(change_breakdown)
         
-        change_amount = session['inserted_money']
+        change_amount = session['inserted_paise'] / 100
         
         # Reset session
-        session['inserted_money'] = 0.0
-        session['denominations_inserted'] = {str(denom): 0 for denom in NOTES + COINS}
+        session['inserted_paise'] = 0
+        session['denominations_inserted'] = dict(_EMPTY_DENOMS)
         session['current_transaction'] = []
         session.modified = True
         
@@ -167,54 +399,51 @@ def return_change():
         if session['current_transaction']:
             log_transaction({})
         
-        session['inserted_money'] = 0.0
-        session['denominations_inserted'] = {str(denom): 0 for denom in NOTES + COINS}
+        session['inserted_paise'] = 0
+        session['denominations_inserted'] = dict(_EMPTY_DENOMS)
         session['current_transaction'] = []
         session.modified = True
         
         return jsonify({'info': 'Thank you for your purchase!'})
 
-@app.route('/admin')
+@admin_bp.route('')
 def admin():
-    transactions = TransactionLog.query.order_by(TransactionLog.date.desc(), TransactionLog.time.desc()).limit(50).all()
-    products = Product.query.order_by(Product.id).all()
+    transactions = TransactionLog.query.options(raiseload('*')).order_by(TransactionLog.created_at.desc()).limit(50).all()
+    products = Product.query.options(raiseload('*')).order_by(Product.id).all()
     return render_template('admin.html', transactions=transactions, products=products)
 
-@app.route('/admin/update_product', methods=['POST'])
+@admin_bp.route('/update_product', methods=['POST'])
 def update_product():
     try:
-        product_id = int(request.form['product_id'])
-        name = request.form['name']
-        product_type = request.form['type']
-        price = float(request.form['price'])
-        quantity = int(request.form['quantity'])
+        product_id, name, product_type, price, quantity = _form(
+            product_id=int, name=str, type=str, price=float, quantity=int)
     except ValueError:
         flash('Please enter valid values for all fields', 'error')
-        return redirect(url_for('admin'))
+        return redirect(url_for('admin.admin'))
     
-    product = Product.query.get(product_id)
+    product = db.session.get(Product, product_id)
     if product:
         product.name = name
         product.type = product_type
         product.price = price
         product.quantity = quantity
         db.session.commit()
+        cache.delete_memoized(get_product_lists)
+        forget_product_meta(product_id)
         flash('Product updated successfully!', 'success')
     else:
         flash('Product not found!', 'error')
     
-    return redirect(url_for('admin'))
+    return redirect(url_for('admin.admin'))
 
-@app.route('/admin/add_product', methods=['POST'])
+@admin_bp.route('/add_product', methods=['POST'])
 def add_product():
     try:
-        name = request.form['new_name']
-        product_type = request.form['new_type']
-        price = float(request.form['new_price'])
-        quantity = int(request.form['new_quantity'])
+        name, product_type, price, quantity = _form(
+            new_name=str, new_type=str, new_price=float, new_quantity=int)
     except ValueError:
         flash('Please enter valid values for all fields', 'error')
-        return redirect(url_for('admin'))
+        return redirect(url_for('admin.admin'))
     
     # Get next available ID
     max_id = db.session.query(db.func.max(Product.id)).scalar()
@@ -230,23 +459,28 @@ def add_product():
     
     db.session.add(new_product)
     db.session.commit()
+    cache.delete_memoized(get_product_lists)
+    forget_product_meta(new_id)
     flash(f'Product added successfully with ID: {new_id}', 'success')
     
-    return redirect(url_for('admin'))
+    return redirect(url_for('admin.admin'))
 
-@app.route('/admin/delete_product/<int:product_id>')
+@admin_bp.route('/delete_product/<int:product_id>')
 def delete_product(product_id):
-    product = Product.query.get(product_id)
+    product = db.session.get(Product, product_id)
     if product:
         db.session.delete(product)
         db.session.commit()
+        cache.delete_memoized(get_product_lists)
+        forget_product_meta(product_id)
         flash('Product deleted successfully!', 'success')
     else:
         flash('Product not found!', 'error')
     
-    return redirect(url_for('admin'))
+    return redirect(url_for('admin.admin'))
 
 @app.route('/database_info')
+@cache.cached(timeout=10)
 def database_info():
     info = {
         'database_uri': 'Render PostgreSQL' if 'DATABASE_URL' in os.environ else 'Local SQLite',
@@ -262,69 +496,167 @@ def health_check():
     return jsonify({'status': 'healthy', 'platform': 'Render'})
 
 # Helper functions
-def calculate_change(amount):
-    change_breakdown = {}
-    remaining = amount
-    
-    for denom in sorted(NOTES + COINS, reverse=True):
-        if remaining >= denom:
-            count = int(remaining / denom)
-            change_breakdown[denom] = count
-            remaining = round(remaining - (count * denom), 2)
-    
-    return change_breakdown
+def _form(**fields):
+    """Read request.form fields in order, converting each with its given type."""
+    form = request.form
+    return tuple(convert(form[name]) for name, convert in fields.items())
+
+@lru_cache(maxsize=32)
+def _inserted_message(amount):
+    return f'Inserted: Rs {amount:.2f}'
+
+@lru_cache(maxsize=4096)
+def _min_change_paise(paise):
+    """Return piece counts, aligned with _DENOMS_DESC, for the fewest-pieces change of paise."""
+    counts = [0] * len(_CHANGE_UNITS)
+    # For this denomination set, using as many of the largest note as possible is
+    # always optimal; only the remainder needs the table (greedy fails on e.g. Rs 40)
+    counts[0], remaining = divmod(paise // _PAISE_STEP, _CHANGE_UNITS[0])
+    while remaining:
+        i = _CHANGE_LAST[remaining]
+        counts[i] += 1
+        remaining -= _CHANGE_UNITS[i]
+    return tuple(counts)
+
+def calculate_change(paise):
+    """Return {denomination: count} for the fewest-pieces change of paise."""
+    counts = _min_change_paise(paise)
+    return {denom: count for denom, count in zip(_DENOMS_DESC, counts) if count}
 
 def format_change_message(change_breakdown):
-    message = "Change breakdown:\n"
-    notes = []
-    coins = []
-    
-    for denom, count in change_breakdown.items():
-        if denom >= 1:
-            notes.append(f"Rs {denom}: {count} note(s)")
-        else:
-            coins.append(f"Rs {denom:.2f}: {count} coin(s)")
+    notes = [_NOTE_TEMPLATES[denom].format(count) for denom, count in change_breakdown.items() if denom in _NOTE_TEMPLATES]
+    coins = [_COIN_TEMPLATES[denom].format(count) for denom, count in change_breakdown.items() if denom in _COIN_TEMPLATES]
     
+    lines = ["Change breakdown:"]
     if notes:
-        message += "Notes: " + ", ".join(notes) + "\n"
+        lines.append("Notes: " + ", ".join(notes))
     if coins:
-        message += "Coins: " + ", ".join(coins)
+        lines.append("Coins: " + ", ".join(coins))
+    else:
+        # The message has always ended with a newline when there are no coins
+        lines.append("")
     
-    return message
+    return "\n".join(lines)
 
 def log_transaction(change_breakdown):
     now = datetime.datetime.now()
-    date = now.strftime("%Y-%m-%d")
-    time = now.strftime("%H:%M:%S")
-    
-    # Format inserted denominations
-    inserted_notes = {k: v for k, v in session['denominations_inserted'].items() if float(k) >= 1 and v > 0}
-    inserted_coins = {k: v for k, v in session['denominations_inserted'].items() if float(k) < 1 and v > 0}
     
-    # Format change denominations
-    change_notes = {k: v for k, v in change_breakdown.items() if k >= 1 and v > 0}
-    change_coins = {k: v for k, v in change_breakdown.items() if k < 1 and v > 0}
+    # Split inserted denominations into notes and coins and total them in one pass
+    inserted_notes, inserted_coins, total_inserted = {}, {}, 0
+    for paise, count in session['denominations_inserted'].items():
+        if not count:
+            continue
+        paise = int(paise)
+        total_inserted += paise * count
+        (inserted_notes if paise >= 100 else inserted_coins)[str(_DENOM_BY_PAISE[paise])] = count
     
-    # Calculate total inserted amount
-    total_inserted = sum(float(denom) * count for denom, count in session['denominations_inserted'].items())
+    # Split change denominations the same way
+    change_notes, change_coins = {}, {}
+    for denom, count in change_breakdown.items():
+        if count:
+            (change_notes if denom >= 1 else change_coins)[str(denom)] = count
     
     # Format products purchased
-    products_purchased = ", ".join([f"{item['quantity']}x {item['name']}" for item in session['current_transaction']])
+    items = session['current_transaction']
+    metas = get_product_metas([product_id for product_id, _ in items])
+    purchased = []
+    for product_id, quantity in items:
+        meta = metas.get(product_id)
+        purchased.append(f"{quantity}x {meta[0] if meta else f'product #{product_id}'}")
+    products_purchased = ", ".join(purchased)
     
-    transaction = TransactionLog(
-        date=date,
-        time=time,
-        amount_inserted_notes=str(inserted_notes),
-        amount_inserted_coins=str(inserted_coins),
-        change_returned_notes=str(change_notes),
-        change_returned_coins=str(change_coins),
-        total_amount=total_inserted,
-        change_amount=session['inserted_money'],
+    _start_log_writer()
+    _transaction_log_queue.put(dict(
+        created_at=now,
+        amount_inserted_notes=inserted_notes,
+        amount_inserted_coins=inserted_coins,
+        change_returned_notes=change_notes,
+        change_returned_coins=change_coins,
+        total_amount=total_inserted / 100,
+        change_amount=session['inserted_paise'] / 100,
         products_purchased=products_purchased
-    )
+    ))
+
+# Transaction logs are written by a background thread so the insert and
+# commit stay off the request path
+_transaction_log_queue = queue.Queue()
+_LOG_BATCH_SIZE = 50
+_LOG_WRITE_ATTEMPTS = 3
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+def _start_log_writer():
+    """Start the writer thread in this process if it isn't running.
     
-    db.session.add(transaction)
-    db.session.commit()
+    This runs on first use, not at import: under gunicorn --preload a thread
+    started at import would live in the master and not survive the fork.
+    """
+    global _log_writer
+    with _log_writer_lock:
+        if _log_writer is None or not _log_writer.is_alive():
+            _log_writer = threading.Thread(target=_write_transaction_logs, name='transaction-log-writer', daemon=True)
+            _log_writer.start()
+
+def _write_transaction_logs():
+    stopping = False
+    while not stopping:
+        payloads = []
+        payload = _transaction_log_queue.get()
+        # Write whatever else is already queued in the same commit; None means stop
+        while True:
+            if payload is None:
+                stopping = True
+                break
+            payloads.append(payload)
+            if len(payloads) >= _LOG_BATCH_SIZE:
+                break
+            try:
+                payload = _transaction_log_queue.get_nowait()
+            except queue.Empty:
+                break
+        
+        if payloads:
+            _save_transaction_logs(payloads)
+
+def _save_transaction_logs(payloads):
+    with app.app_context():
+        for attempt in range(_LOG_WRITE_ATTEMPTS):
+            try:
+                db.session.bulk_save_objects([TransactionLog(**payload) for payload in payloads])
+                db.session.commit()
+                return
+            except Exception as e:
+                db.session.rollback()
+                print(f"Failed to write {len(payloads)} transaction log(s), attempt {attempt + 1}: {e}")
+                if attempt + 1 < _LOG_WRITE_ATTEMPTS:
+                    time.sleep(2 ** attempt)
+        
+        # Save what can be saved one row at a time, and print the rest so they
+        # can be recovered from the logs
+        for payload in payloads:
+            try:
+                db.session.add(TransactionLog(**payload))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Dropped transaction log {payload!r}: {e}")
+
+@atexit.register
+def _flush_transaction_logs():
+    """Write queued transaction logs before the process exits (e.g. on a
+    gunicorn worker restart or redeploy)."""
+    if _log_writer is not None and _log_writer.is_alive():
+        _transaction_log_queue.put(None)
+        _log_writer.join(timeout=30)
+
+app.register_blueprint(storefront_bp)
+app.register_blueprint(admin_bp)
+
+# Compile templates at startup so the first request doesn't pay for it, and
+# never stat template files for changes
+app.jinja_env.auto_reload = False
+for template_name in ('index.html', 'admin.html'):
+    app.jinja_env.get_template(template_name)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 10000))
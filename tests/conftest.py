@@ -0,0 +1,11 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# Point the app at a throwaway SQLite file before it is imported, since the
+# schema is created at import time
+_db_dir = tempfile.mkdtemp(prefix='vending-test-')
+atexit.register(shutil.rmtree, _db_dir, ignore_errors=True)
+os.environ.pop('DATABASE_URL', None)
+os.environ['LOCAL_DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'vending_machine.db')
@@ -0,0 +1,22 @@
+from app import COINS, NOTES, calculate_change
+
+
+def test_calculate_change_avoids_greedy_breakdown():
+    # Greedy would give 25 + 10 + 5
+    assert calculate_change(4000) == {20: 2}
+
+
+def test_calculate_change_uses_fewest_pieces():
+    denoms = [int(round(denom * 100)) for denom in NOTES + COINS]
+    limit = 200000
+    # Plain fewest-pieces DP over every amount up to Rs 2000
+    fewest = [0] + [None] * limit
+    for paise in range(1, limit + 1):
+        options = [fewest[paise - denom] for denom in denoms
+                   if denom <= paise and fewest[paise - denom] is not None]
+        fewest[paise] = min(options) + 1 if options else None
+
+    for paise in range(0, limit + 1, 5):
+        change = calculate_change(paise)
+        assert sum(int(round(denom * 100)) * count for denom, count in change.items()) == paise
+        assert sum(change.values()) == fewest[paise]
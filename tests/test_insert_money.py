@@ -0,0 +1,9 @@
+from app import app
+
+
+def test_insert_money_rejects_unparseable_amounts():
+    client = app.test_client()
+    client.get('/')
+    for amount in ('nan', 'inf', '-inf', 'abc'):
+        response = client.post('/insert_money', data={'amount': amount})
+        assert response.status_code == 400
@@ -0,0 +1,11 @@
+import datetime
+
+from flask import jsonify
+
+from app import app
+
+
+def test_jsonify_formats_datetimes_as_http_dates():
+    with app.app_context():
+        response = jsonify({'at': datetime.datetime(2024, 1, 2, 3, 4, 5)})
+    assert response.get_json() == {'at': 'Tue, 02 Jan 2024 03:04:05 GMT'}
@@ -0,0 +1,16 @@
+from app import Product, app, db
+
+
+def test_purchase_rejects_non_positive_quantity():
+    client = app.test_client()
+    client.get('/')
+    client.post('/insert_money', data={'amount': '100'})
+    with app.app_context():
+        stock = db.session.get(Product, 1).quantity
+
+    for quantity in ('0', '-3'):
+        response = client.post('/purchase', data={'product_id': '1', 'quantity': quantity})
+        assert response.status_code == 400
+
+    with app.app_context():
+        assert db.session.get(Product, 1).quantity == stock
@@ -0,0 +1,21 @@
+from app import app
+
+
+def test_session_round_trip_keeps_tuples_and_flashes():
+    serializer = app.session_interface.get_signing_serializer(app)
+    data = {
+        'current_transaction': [(1, 2), (4, 1)],
+        '_flashes': [('success', 'Product updated successfully!')],
+    }
+    # flask.json only uses the app's JSON provider inside an app context
+    with app.app_context():
+        assert serializer.loads(serializer.dumps(data)) == data
+
+
+def test_flash_message_survives_redirect():
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_flashes'] = [('error', 'Product not found!')]
+    response = client.get('/admin')
+    assert response.status_code == 200
+    assert b'Product not found!' in response.data
@@ -0,0 +1,52 @@
+import datetime
+
+from sqlalchemy import text
+
+from app import Product, TransactionLog, app, cache, create_tables, db, forget_product_meta
+
+# Tables as created by the original version of the app, with denomination
+# counts stored as Python dict reprs
+BASELINE_SCHEMA = [
+    "CREATE TABLE product (id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, type VARCHAR(50) NOT NULL,"
+    " price FLOAT NOT NULL, quantity INTEGER NOT NULL, PRIMARY KEY (id))",
+    "CREATE TABLE transaction_log (id INTEGER NOT NULL, date VARCHAR(20) NOT NULL, time VARCHAR(20) NOT NULL,"
+    " amount_inserted_notes TEXT NOT NULL, amount_inserted_coins TEXT NOT NULL,"
+    " change_returned_notes TEXT NOT NULL, change_returned_coins TEXT NOT NULL,"
+    " total_amount FLOAT NOT NULL, change_amount FLOAT NOT NULL, products_purchased TEXT, PRIMARY KEY (id))",
+    "INSERT INTO product VALUES (1, 'sando', 'cake', 15, 10), (2, 'lays', 'cake', 20, 8)",
+    "INSERT INTO transaction_log VALUES (1, '2024-05-01', '10:15:00', '{''100'': 1}', '{''0.5'': 2}',"
+    " '{50: 1, 20: 1}', '{0.5: 1, 0.25: 2}', 101.0, 71.0, '1x sando')",
+    "INSERT INTO transaction_log VALUES (2, '2024-05-02', '09:00:01', '{}', '{}', '{}', '{}', 0.0, 0.0, '')",
+]
+
+
+def test_create_tables_upgrades_baseline_schema():
+    with app.app_context():
+        db.drop_all()
+        with db.engine.begin() as conn:
+            for statement in BASELINE_SCHEMA:
+                conn.execute(text(statement))
+        try:
+            create_tables()
+            create_tables()
+
+            logs = db.session.query(TransactionLog).order_by(TransactionLog.id).all()
+            assert [log.created_at for log in logs] == [datetime.datetime(2024, 5, 1, 10, 15),
+                                                        datetime.datetime(2024, 5, 2, 9, 0, 1)]
+            assert logs[0].amount_inserted_notes == {'100': 1}
+            assert logs[0].amount_inserted_coins == {'0.5': 2}
+            assert logs[0].change_returned_notes == {'50': 1, '20': 1}
+            assert logs[0].change_returned_coins == {'0.5': 1, '0.25': 2}
+            assert logs[1].change_returned_notes == {}
+
+            inspector = db.inspect(db.engine)
+            assert 'ix_transaction_log_created_at' in {index['name'] for index in inspector.get_indexes('transaction_log')}
+            assert 'ix_product_type_id' in {index['name'] for index in inspector.get_indexes('product')}
+            assert db.session.query(Product).count() == 2
+        finally:
+            db.session.remove()
+            db.drop_all()
+            create_tables()
+            cache.clear()
+            for product_id in (1, 2):
+                forget_product_meta(product_id)